@@ -1,5 +1,20 @@
 # imports
+import ast
+import codecs
+import csv
+import functools
+import json
+import os
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+
+def _noop(*args, **kwargs):
+    pass
+
 
 # wrape this in try/except to make suing the ReportCollector portable
 # probably an abstract base class would be better
@@ -9,21 +24,25 @@ try:
 
 except ImportError:
     class DummyStreamlit:
+        # any st.* call (markdown, error, divider, ...) resolves to the same no-op
+        def __getattr__(self, name):
+            return _noop
+
         @staticmethod
-        def markdown(self,msg):
-            pass
-        def error(self,msg):
-            pass
-        def header(self,msg):
-            pass        
-        def subheader(self,msg):
-            pass    
-        def divider(self):
-            pass
+        def cache_data(func=None, **kwargs):
+            # no caching outside streamlit; works bare or with arguments
+            return func if func is not None else (lambda f: f)
     st = DummyStreamlit()
     print("Streamlit NOT successfully imported")
 
 NULL = "NA"
+# cell values read as empty
+NULL_TOKENS = ["", "none", "nan", "Nan"]
+# pandas' default read_csv NA strings (pyarrow's defaults lack "<NA>"/"None") plus ours
+ARROW_NA_VALUES = pa_csv.ConvertOptions().null_values + ["<NA>", "None"] + NULL_TOKENS
+UNKNOWN_TOKENS = ["Unknown", "unknown"]
+# integer text as int() accepts it: optional sign and surrounding spaces, no fraction
+INTEGER_PATTERN = r"\s*[-+]?\d+\s*"
 
 # streamlit specific helpers which don't depend on streamlit
 def load_css(file_name):
@@ -37,27 +56,104 @@ def get_log(log_file):
     return report_content
 
 def columnize( itemlist ):
-    NEWLINE_DASH = ' \n- '
-    if len(itemlist) > 1:
-        return f"- {itemlist[0]}{NEWLINE_DASH.join(itemlist[1:])}"
-    else:
-        return f"- {itemlist[0]}"
-    
-def read_meta_table(table_path):
-    # read the whole table
+    """ render a list as markdown bullets, one item per line """
+    return '- ' + '\n- '.join(itemlist) if itemlist else ''
+
+def quote_join(values):
+    """ single-quote each value and join with commas (vectorized) """
+    return ', '.join("'" + pd.Index(values).astype(str) + "'")
+
+@functools.lru_cache(maxsize=None)
+def parse_literal_list(raw):
+    """ parse a CDE list literal (e.g. Validation) once per distinct string, returned as a tuple """
+    raw = str(raw).strip()
+    if not raw:
+        return ()
+    # CDE lists are double-quoted, so json is the fast path; literal_eval covers python-only syntax
     try:
-        table_df = pd.read_csv(table_path,dtype=str)
+        return tuple(json.loads(raw))
+    except ValueError:
+        return tuple(ast.literal_eval(raw))
+
+def sniff_encoding(table_path, sample_size=65536):
+    """ guess the table encoding from the first bytes instead of re-reading the whole file """
+    with open(table_path, 'rb') as f:
+        head = f.read(sample_size)
+    if head.isascii():
+        return 'utf-8'
+    try:
+        # incremental decoder tolerates a multi-byte character cut off at the end of the sample
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
     except UnicodeDecodeError:
-        table_df = pd.read_csv(table_path, encoding='latin1',dtype=str)
+        return 'latin1'
+
+def read_csv_arrow(table_path, encoding):
+    """ parse every column straight to arrow strings with the multithreaded pyarrow reader """
+    # read just the header row; utf-8-sig drops a BOM as pyarrow would
+    with open(table_path, encoding='utf-8-sig' if encoding == 'utf-8' else encoding, newline='') as f:
+        header = next(csv.reader(f), [])
+    # name empty headers as pandas does, so the index column is still found and dropped
+    names = [name or f"Unnamed: {i}" for i, name in enumerate(header)]
+    if len(set(names)) < len(names):
+        raise pa.ArrowInvalid("duplicate column names")
+    read_options = pa_csv.ReadOptions(encoding=encoding, column_names=names, skip_rows_after_names=1)
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+    # pandas' engine="pyarrow" infers types before casting (e.g. "007" -> "7.0"), so pin every column to string
+    convert_options = pa_csv.ConvertOptions(
+        column_types=dict.fromkeys(names, pa.string()),
+        null_values=ARROW_NA_VALUES,
+        strings_can_be_null=True,
+    )
+    table = pa_csv.read_csv(table_path, read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+# keyed on mtime, so bound the cache to evict the tables of older file versions
+@st.cache_data(show_spinner=False, max_entries=8)
+def _read_meta_table(table_path, mtime):
+    # read the whole table into arrow-backed strings (fast isin/==/unique)
+    encoding = sniff_encoding(table_path)
+    try:
+        table_df = read_csv_arrow(table_path, encoding)
+    except pa.ArrowInvalid:
+        # malformed rows or duplicate headers: let the pandas parser handle (and mangle) them
+        try:
+            table_df = pd.read_csv(table_path, encoding=encoding, dtype="string[pyarrow]", na_values=NULL_TOKENS)
+        except UnicodeDecodeError:
+            # non-utf-8 bytes past the sniffed sample
+            table_df = pd.read_csv(table_path, encoding='latin1', dtype="string[pyarrow]", na_values=NULL_TOKENS)
 
     # drop the first column if it is just the index
     if table_df.columns[0] == "Unnamed: 0":
-        table_df = table_df.drop(columns=["Unnamed: 0"])
-        
-    table_df.replace({"":NULL, pd.NA:NULL, "none":NULL, "nan":NULL, "Nan":NULL}, inplace=True)
+        table_df = table_df.drop(columns=[table_df.columns[0]])
+
+    # null-like tokens were already turned into missing cells by the parser
+    table_df.fillna(NULL, inplace=True)
 
     return table_df
 
+def read_meta_table(table_path):
+    # key the cache on the file's mtime so edits on disk are re-read
+    return _read_meta_table(table_path, os.path.getmtime(table_path))
+
+
+def recode_as_null(df, columns, tokens):
+    """ recode any of `tokens` as NULL in place, only rewriting the columns that contain them """
+    for column in columns:
+        # one hashed pass per column instead of one comparison pass per token
+        missing = df[column].isin(tokens)
+        if missing.any():
+            df[column] = df[column].mask(missing, NULL)
+
+# text-log rendering for each ReportCollector entry type (divider's None msg is ignored by format)
+LOG_FORMATS = {
+    "markdown": "{}\n".format,
+    "error": "🚨⚠️❗ **{}**\n".format,
+    "header": "# {}\n".format,
+    "subheader": "## {}\n".format,
+    "divider": (60*'-' + '\n').format,
+}
+
 
 class ReportCollector:
     """
@@ -66,6 +162,8 @@ class ReportCollector:
 
     def __init__(self, destination="both"):
         self.entries = []
+        # text-log lines rendered as entries are added, so get_log is just a join
+        self.log_parts = []
         self.filename = None
 
         if destination in ["both", "streamlit"]:
@@ -73,32 +171,46 @@ class ReportCollector:
         else:
             self.publish_to_streamlit = False
 
+        # bind the streamlit emitters once so the add_* methods don't branch per entry
+        if self.publish_to_streamlit:
+            self._st_markdown = st.markdown
+            self._st_error = st.error
+            self._st_header = st.header
+            self._st_subheader = st.subheader
+            self._st_divider = st.divider
+        else:
+            self._st_markdown = _noop
+            self._st_error = _noop
+            self._st_header = _noop
+            self._st_subheader = _noop
+            self._st_divider = _noop
+
+
+    def _log(self, msg_type, msg):
+        self.entries.append((msg_type, msg))
+        self.log_parts.append(LOG_FORMATS[msg_type](msg))
+
 
     def add_markdown(self, msg):
-        self.entries.append(("markdown", msg))
-        if self.publish_to_streamlit:
-            st.markdown(msg)
+        self._log("markdown", msg)
+        self._st_markdown(msg)
 
 
     def add_error(self, msg):
-        self.entries.append(("error", msg))
-        if self.publish_to_streamlit:
-            st.error(msg)
+        self._log("error", msg)
+        self._st_error(msg)
 
     def add_header(self, msg):
-        self.entries.append(("header", msg))
-        if self.publish_to_streamlit:    
-            st.header(msg)
+        self._log("header", msg)
+        self._st_header(msg)
 
     def add_subheader(self, msg):
-        self.entries.append(("subheader", msg))
-        if self.publish_to_streamlit:    
-            st.subheader(msg)
+        self._log("subheader", msg)
+        self._st_subheader(msg)
 
     def add_divider(self):
-        self.entries.append(("divider", None))
-        if self.publish_to_streamlit:    
-            st.divider()
+        self._log("divider", None)
+        self._st_divider()
 
     
     def write_to_file(self, filename):
@@ -110,23 +222,11 @@ class ReportCollector:
 
     def get_log(self):
         """ grab logged information from the log file."""
-        report_content = []
-        for msg_type, msg in self.entries:
-            if msg_type == "markdown":
-                report_content += msg + '\n'
-            elif msg_type == "error":
-                report_content += f"🚨⚠️❗ **{msg}**\n"
-            elif msg_type == "header":
-                report_content += f"# {msg}\n"
-            elif msg_type == "subheader":
-                report_content += f"## {msg}\n"
-            elif msg_type == "divider":
-                report_content += 60*'-' + '\n'
-        
-        return "".join(report_content)
+        return "".join(self.log_parts)
 
     def reset(self):
         self.entries = []
+        self.log_parts = []
         self.filename = None
 
     def print_log(self):
@@ -194,7 +294,7 @@ def validate_table_old(df: pd.DataFrame, table_name: str, specific_cde_df: pd.Da
                 # test that all are float or NULL, flag NULL entries
             elif datatype.item() == "Enum":
 
-                valid_values = eval(specific_cde_df.loc[entry_idx,"Validation"].item())
+                valid_values = list(parse_literal_list(specific_cde_df.loc[entry_idx,"Validation"].item()))
                 valid_values += [NULL]
                 entries = df[field]
                 valid_entries = entries.apply(lambda x: x in valid_values)
@@ -246,7 +346,7 @@ def validate_table_old(df: pd.DataFrame, table_name: str, specific_cde_df: pd.Da
             out.add_error(f"Extra field in {table_name}: {field}")
 
 
-    return df.copy(), out
+    return df, out
 
 
 
@@ -254,79 +354,90 @@ def validate_table(df: pd.DataFrame, table_name: str, specific_cde_df: pd.DataFr
     """
     Validate the table against the specific table entries from the CDE
     """
-    def my_str(x):
-        return f"'{str(x)}'"
-        
-    missing_required = []
-    missing_optional = []
-    null_fields = []
     invalid_entries = []
     total_rows = df.shape[0]
-    for field in specific_cde_df["Field"]:
-        entry_idx = specific_cde_df["Field"]==field
-
-        opt_req = "REQUIRED" if specific_cde_df.loc[entry_idx, "Required"].item()=="Required" else "OPTIONAL"
-
-        if field not in df.columns:
-            if opt_req == "REQUIRED":
-                missing_required.append(field)
+    # split the CDE into missing and present fields with one hashed membership test
+    is_present = specific_cde_df["Field"].isin(df.columns)
+    is_required = specific_cde_df["Required"] == "Required"
+    missing_required = specific_cde_df.loc[~is_present & is_required, "Field"].tolist()
+    missing_optional = specific_cde_df.loc[~is_present & ~is_required, "Field"].tolist()
+
+    # pull the present CDE rows out as plain lists once; no per-field pandas scalar extraction
+    present_cde_df = specific_cde_df[is_present]
+    fields = present_cde_df["Field"].tolist()
+    opt_reqs = ["REQUIRED" if req else "OPTIONAL" for req in is_required[is_present]]
+    datatypes = present_cde_df["DataType"].tolist()
+    validations = present_cde_df["Validation"].tolist()
+
+    # recode "Unknown" as NULL once, before any field is checked, when the table has numeric fields
+    numeric_fields = [field for field, datatype in zip(fields, datatypes) if datatype in ["Integer", "Float"]]
+    if numeric_fields:
+        recode_as_null(df, fields, UNKNOWN_TOKENS)
+
+    for field, opt_req, datatype, validation in zip(fields, opt_reqs, datatypes, validations):
+        if datatype == "Integer":
+            print(f"recoding {field} as int")
+
+            values = df[field]
+            if pd.api.types.is_numeric_dtype(values):
+                # numeric columns (e.g. from xlsx): whole numbers are valid, missing cells are NULL
+                not_null = values.notna().to_numpy(dtype=bool)
+                invalid_mask = not_null & (values % 1 != 0).to_numpy(dtype=bool)
             else:
-                missing_optional.append(field)
-
-            # print(f"missing {opt_req} column {field}")
-
-        else:
-            datatype = specific_cde_df.loc[entry_idx,"DataType"]
-            if datatype.item() == "Integer":
-                # recode "Unknown" as NULL
-                print(f"recoding {field} as int")
-
-                df.replace({"Unknown":NULL, "unknown":NULL}, inplace=True)
-                try:
-                    df[field].apply(lambda x: int(x) if x!=NULL else x )
-                except Exception as e:
-                    # print(e)
-                    # print(f"Error in {field}")
-                    invalid_values = df[field].unique()
-                    n_invalid = invalid_values.shape[0]
-                    valstr = "int or NULL ('NA')"
-                    invalstr = ', '.join(map(my_str,invalid_values))
-                    invalid_entries.append((opt_req, field, n_invalid, valstr, invalstr))
-
-                # test that all are integer or NULL, flag NULL entries
-            elif datatype.item() == "Float":
-                # recode "Unknown" as NULL
-                df.replace({"Unknown":NULL, "unknown":NULL}, inplace=True)
-                try:
-                    df[field] = df[field].apply(lambda x: float(x) if x!=NULL else x )
-                except Exception as e:
-                    # print(e)
-                    # print(f"Error in {field}")
-                    invalid_values = df[field].unique()
-                    n_invalid = invalid_values.shape[0]
+                # match integer text directly: no float round trip, exact past 2**53
+                entries = values.astype("string[pyarrow]")
+                # a missing cell is not NULL and never matches, so it is reported like any other bad value
+                not_null = (entries != NULL).fillna(True).to_numpy(dtype=bool)
+                invalid_mask = np.zeros(len(entries), dtype=bool)
+                # an all-NULL column has nothing to check
+                if not_null.any():
+                    invalid_mask = not_null & ~entries.str.fullmatch(INTEGER_PATTERN).fillna(False).to_numpy(dtype=bool)
+            if invalid_mask.any():
+                # pick out the bad cells before deduping, instead of materializing the whole column
+                invalid_values = values[invalid_mask].unique()
+                n_invalid = len(invalid_values)
+                valstr = "int or NULL ('NA')"
+                invalstr = quote_join(invalid_values)
+                invalid_entries.append((opt_req, field, n_invalid, valstr, invalstr))
+
+            # test that all are integer or NULL, flag NULL entries
+        elif datatype == "Float":
+            # missing cells (e.g. NaN from xlsx) are empty, not invalid
+            not_null = ((df[field] != NULL).fillna(True) & df[field].notna()).to_numpy(dtype=bool)
+            # an all-NULL column has nothing to parse
+            if not_null.any():
+                # one vectorized parse; anything non-numeric comes back as NA
+                numeric = pd.to_numeric(df[field].where(not_null), errors="coerce")
+                invalid_mask = numeric.isna().to_numpy(dtype=bool) & not_null
+                if invalid_mask.any():
+                    # pick out the bad cells before deduping, instead of materializing the whole column
+                    invalid_values = df[field][invalid_mask].unique()
+                    n_invalid = len(invalid_values)
                     valstr = "float or NULL ('NA')"
-                    invalstr = ', '.join(map(my_str,invalid_values))
+                    invalstr = quote_join(invalid_values)
                     invalid_entries.append((opt_req, field, n_invalid, valstr, invalstr))
+                else:
+                    # keep the parsed floats, and the NULL markers or missing cells as they were
+                    df[field] = numeric.astype(float).astype(object).where(not_null, df[field])
+
+            # test that all are float or NULL, flag NULL entries
+        elif datatype == "Enum":
+
+            valid_values = parse_literal_list(validation) + (NULL,)
+            # dedupe the column in one hashing pass (arrow's kernel on arrow columns), then test only the distinct values
+            unique_entries = df[field].unique()
+            invalid_values = unique_entries[~pd.Index(unique_entries).isin(valid_values)]
+            n_invalid = len(invalid_values)
+            if n_invalid > 0:
+                valstr = quote_join(valid_values)
+                invalstr = quote_join(invalid_values)
+                invalid_entries.append((opt_req, field, n_invalid, valstr, invalstr))
+        else: #dtype == String
+            pass
 
-                # test that all are float or NULL, flag NULL entries
-            elif datatype.item() == "Enum":
-
-                valid_values = eval(specific_cde_df.loc[entry_idx,"Validation"].item())
-                valid_values += [NULL]
-                entries = df[field]
-                valid_entries = entries.apply(lambda x: x in valid_values)
-                invalid_values = entries[~valid_entries].unique()
-                n_invalid = invalid_values.shape[0]
-                if n_invalid > 0:
-                    valstr = ', '.join(map(my_str, valid_values))
-                    invalstr = ', '.join(map(my_str,invalid_values))
-                    invalid_entries.append((opt_req, field, n_invalid, valstr, invalstr))
-            else: #dtype == String
-                pass
-            
-            n_null = (df[field]==NULL).sum()
-            if n_null > 0:            
-                null_fields.append((opt_req, field, n_null))
+    # count NULLs for every present CDE column in one columnar pass
+    null_counts = (df[fields] == NULL).sum().astype(int)
+    null_fields = [(opt_req, field, null_counts[field]) for opt_req, field in zip(opt_reqs, fields) if null_counts[field] > 0]
 
 
     # now compose report...
@@ -346,24 +457,26 @@ def validate_table(df: pd.DataFrame, table_name: str, specific_cde_df: pd.DataFr
     if len(null_fields) > 0:
         # print(f"{opt_req} {field} has {n_null}/{df.shape[0]} NULL entries ")
         out.add_error(f"{len(null_fields)} Fields with empty (NULL) values:")
-        for opt_req, field, count in null_fields:
-            out.add_markdown(f"\n\t- {field}: {count}/{total_rows} empty rows ({opt_req})")
+        out.add_markdown("\n".join(
+            f"\n\t- {field}: {count}/{total_rows} empty rows ({opt_req})" for opt_req, field, count in null_fields
+        ))
     else:
         out.add_markdown(f"No empty entries (NULL) found .")
 
 
     if len(invalid_entries) > 0:
         out.add_error(f"{len(invalid_entries)} Fields with invalid entries:")
-        for opt_req, field, count, valstr, invalstr in invalid_entries:
-            str_out = f"- _*{field}*_:  invalid values 💩{invalstr}\n"
-            str_out += f"    - valid ➡️ {valstr}"
-            out.add_markdown(str_out)
+        # one markdown block for all fields instead of one entry (and one st.markdown) per field
+        out.add_markdown("\n".join(
+            f"- _*{field}*_:  invalid values 💩{invalstr}\n    - valid ➡️ {valstr}"
+            for opt_req, field, count, valstr, invalstr in invalid_entries
+        ))
     else:
         out.add_markdown(f"No invalid entries found in Enum fields.")
 
-    for field in df.columns:
-        if field not in specific_cde_df["Field"].values:
-            out.add_error(f"Extra field in {table_name}: {field}")
+    # hashed Index set difference; sort=False keeps the table's column order
+    for field in df.columns.difference(specific_cde_df["Field"], sort=False):
+        out.add_error(f"Extra field in {table_name}: {field}")
    
 
 